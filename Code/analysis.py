@@ -1,9 +1,5 @@
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Qt5Agg')
 import numpy as np
 import trial
-from sklearn.metrics import mean_squared_error
 
 
 '''
@@ -15,13 +11,22 @@ event percentage, run times, etc.
 '''
 
 
+# Matplotlib is only loaded (with the Qt5Agg backend) once something is plotted
+def pyplot():
+    import matplotlib
+    if matplotlib.get_backend() != 'Qt5Agg':
+        matplotlib.use('Qt5Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
 def plot_times(events, event_times):
+    plt = pyplot()
 
-    events = np.asarray(events)[:,1]
-    event_times = np.asarray(event_times)[:, 1]
+    events = event_column(events)
+    event_times = event_column(event_times)
 
-    event_indices = event_times * (events == trial.UPDATED_PARAMS)
-    event_indices = event_indices[event_indices != 0]
+    event_indices = event_times[events == trial.UPDATED_PARAMS]
 
     times = np.load('times.npy')
 
@@ -34,20 +39,19 @@ def plot_times(events, event_times):
 
 
 def plot_event_rates(events, event_times, event_type):
+    plt = pyplot()
+
+    ev = event_column(events)
+    et = event_column(event_times)
 
     samples_per_min = trial.freq * 60
-    data_length = event_times.iloc[len(events)-1, 1]
+    data_length = et[len(ev)-1]
     num_bins = int(data_length / samples_per_min)
-    event_rates = np.zeros(num_bins)
-
-    for index, row in events.iterrows():
-        event = row[1]
-        event_time = event_times.iloc[index,1]
-        if event == event_type:
-            bin = int(event_time / samples_per_min)
-            event_rates[bin] += 1
-    x = np.linspace(1, num_bins, num_bins)
-    plt.plot(x, event_rates, linewidth=2)
+
+    # Counting the events of the given type that fall into each minute
+    bins = (et[ev == event_type] // samples_per_min).astype(np.int64)
+    event_rates = np.bincount(bins, minlength=num_bins)[:num_bins]
+    plt.plot(np.arange(1, num_bins + 1), event_rates, linewidth=2)
     plt.ylabel('Events per min')
     plt.xlabel('Time (mins)')
     plt.show()
@@ -55,23 +59,16 @@ def plot_event_rates(events, event_times, event_type):
 
 def plot_event_percent(data, events, event_times, event_type):
 
-    #data_length = event_times.iloc[len(events), 1]
+    events = event_column(events)
+    #data_length = event_times[len(events)]
 
     window_width = 75 # Number of trials
-    num_trials = sum(events <= 7)
-    trial_num = 0
+    num_trials = np.count_nonzero(events <= 7)
     #percentages = np.zeros(math.ceil(num_trials / window_width)
     percentages = np.zeros(num_trials)
 
-    for iter, row in events.iterrows():
-        event = row[1]
-
-        if event <= 7:
-
-            trial_num += 1
-
     if num_trials < window_width:
-        percentages[0] = sum(events == event_type) / window_width
+        percentages[0] = np.count_nonzero(events == event_type) / window_width
 
     # for i in range(len(percentages)):
     #     start = max(0, i - (window_width / 2))
@@ -85,25 +82,18 @@ def plot_event_percent(data, events, event_times, event_type):
 
 
 def plot_state_comparison(data):
-    prev_state = np.zeros(2)
-    prev_vel = [0, 0]
-    state_mses = []
-    vel_mses = []
-    states = []
-    vels = []
-    for iter, row in data.iterrows():
-        state = np.asarray(row[1:23])
-        state = state[10:12]
-        vel = np.asarray(row[27:29])
-        state_mses.append(mean_squared_error(state, prev_state))
-        percent_diff_state = (np.subtract(state_mses[iter], state_mses[iter - 1])) / state_mses[iter - 1] * 100
-        states.append(percent_diff_state)
-        vel_mses.append(mean_squared_error(vel, prev_vel))
-        percent_diff_vel = (np.subtract(vel_mses[iter], vel_mses[iter - 1])) / vel_mses[iter - 1] * 100
-        vels.append(percent_diff_vel)
-
-        prev_state = state.copy()
-        prev_vel = vel.copy()
+    plt = pyplot()
+
+    # Mean squared change between consecutive samples (the first sample is compared to zero)
+    states_arr = data.iloc[:, 11:13].to_numpy()
+    vels_arr = data.iloc[:, 27:29].to_numpy()
+    state_mse = (np.diff(states_arr, axis=0, prepend=0) ** 2).mean(axis=1)
+    vel_mse = (np.diff(vels_arr, axis=0, prepend=0) ** 2).mean(axis=1)
+
+    # Percent difference of each MSE from the previous one
+    states = np.r_[0, np.diff(state_mse) / state_mse[:-1] * 100]
+    vels = np.r_[0, np.diff(vel_mse) / vel_mse[:-1] * 100]
+
     x = range(len(states))
     plt.plot(x, states, label='states')
     plt.figure()
@@ -114,6 +104,8 @@ def plot_state_comparison(data):
 
 # Plot paths of cursor
 def plot_paths(cursor_num, data, events, event_times, show_intention, paths):
+    plt = pyplot()
+    from matplotlib.collections import LineCollection
 
     fig, ax = plt.subplots()
 
@@ -121,31 +113,32 @@ def plot_paths(cursor_num, data, events, event_times, show_intention, paths):
                         color='m')
     ax.add_artist(center)
 
+    # Indices of the events where a target was shown and where the center was reached
+    ev = event_column(events)
+    et = event_column(event_times)
+    start_idx = np.flatnonzero(ev <= 7)
+    end_idx = np.flatnonzero(ev == trial.CENTER_REACHED)
+
     for path in paths:
-        current_path = 0
-        target_label = 0
-        start = 0
-        end = 0
         ax.set(xlim=(-5, 5), ylim=(-5, 5))
         ax.set_aspect('equal', adjustable='box')
 
-        for index, row in events.iterrows():
-            event = row[1]
-            event_time = event_times.iloc[index,1]
-            if event <= 7:
-                target_label = event
-                start = event_time
-            elif event == trial.CENTER_REACHED:
-                current_path += 1
-                end = event_time
-                if current_path == path:
-                    break
-
-        if path > current_path:
+        if path > len(end_idx):
             break
 
-        x = trial.target_positions[target_label][0]
-        y = trial.target_positions[target_label][1]
+        # The path ends when the center is reached for the path-th time and starts at the last target before it.
+        # A path without any target before it can't be drawn, rather than wrapping around to the last target
+        end_event = end_idx[path - 1]
+        target_index = np.searchsorted(start_idx, end_event) - 1
+        if target_index < 0:
+            continue
+        start_event = start_idx[target_index]
+        target_label = ev[start_event]
+        start = et[start_event]
+        end = et[end_event]
+
+        x = trial.TARGET_POSITIONS[target_label][0]
+        y = trial.TARGET_POSITIONS[target_label][1]
         target = plt.Circle((x, y), radius=0.4, alpha=0.5, color='b')
         ax.add_artist(target)
 
@@ -153,18 +146,24 @@ def plot_paths(cursor_num, data, events, event_times, show_intention, paths):
 
         plt.plot(positions[:,0], positions[:,1])
         if show_intention:
-            intentions = data.iloc[start:end, 27:29]
-            for iter in range(len(positions)):
-                if iter % 3 == 0:
-                    intended_position = positions[iter,:] + (intentions.iloc[iter,:]*3)
-                    plt.plot([positions[iter,0], intended_position[0]], [positions[iter,1], intended_position[1]])
-                    iter += 1
+            # Drawing every third intended velocity as one segment from the cursor position
+            step = positions[::3]
+            intentions = data.iloc[start:end, 27:29].to_numpy()[::3] * 3
+            segments = np.stack([step, step + intentions], axis=1)
+            ax.add_collection(LineCollection(segments))
 
     plt.xticks([])
     plt.yticks([])
     plt.show()
 
 
+# Events and event times can be passed as loaded from their csv file, or directly as a 1-D array of the values
+def event_column(events):
+    if hasattr(events, 'iloc'):
+        return events.iloc[:, 1].to_numpy()
+    return np.asarray(events)
+
+
 def not_zero(num):
    if num == 0: num = 1
    return num
@@ -179,5 +178,5 @@ def not_zero(num):
 # events_file_name = f'subject99_Cursor0_{date}_{time}_events.csv'
 # event_times_file_name = f'subject99_Cursor0_{date}_{time}_event_times.csv'
 # data = pd.read_csv(data_file_name)
-# events = pd.read_csv(events_file_name)
-# event_times = pd.read_csv(event_times_file_name)
+# events = pd.read_csv(events_file_name, engine='c', dtype=np.int64).iloc[:, 1].to_numpy()
+# event_times = pd.read_csv(event_times_file_name, engine='c', dtype=np.int64).iloc[:, 1].to_numpy()
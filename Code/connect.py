@@ -1,8 +1,13 @@
 import zmq
+import struct
 import numpy as np
 from glove import CyberGlove, CyberGloveException
 
 
+STATE_DTYPE = np.float32  # Data type of the glove states sent over a state stream
+BATCH_HEADER = struct.Struct('<HH')  # Header of each state stream message: number of states, number of sensors
+
+
 def list_ports():
     """
     Get a simple list of al the available ports.
@@ -36,20 +41,22 @@ def open_glove(port, **kwargs):
     return glove
 
 
-def connect_state_stream(address):
+def connect_state_stream(address, drop_stale=False):
     """
     Create a socket that will listen to published events and try to interpret them as a glove sensor state
 
     This function opens a zmq subscriber socket on the given address, and listens for any and all incoming messages.
-    Whenever it receives a message (expected to be in JSON format), it will try to interpret the message as a numpy
-    array of glove sensor states.
+    Whenever it receives a message (expected to be a BATCH_HEADER frame followed by the raw bytes of a STATE_DTYPE
+    array, see server.publish_glove_state), it will interpret the message as a batch of glove sensor states.
 
     Implementation wise, this function is a generator, so the returned object behaves like an iterable, where each next
     item is the next state received in the stream. Simply throw it in a for loop and iterate through the sensor states,
     but be sure to close the stream when you are done.
 
     :param address: Address (including transport protocol) to listen on
-    :return: Generator object of the senor state stream
+    :param drop_stale: optional. If True, any states queued up behind the one received are skipped so that the most
+        recent state is always returned. Useful for real-time consumers that run slower than the glove
+    :return: Generator object of the senor state stream. The yielded arrays are read-only views of the received message
     """
 
     context = zmq.Context()
@@ -63,10 +70,23 @@ def connect_state_stream(address):
 
     try:
         while True:
-            # Wait for the
-            data = subscriber.recv_json()
-            state = np.array(data)
-            yield state
+            # Wait for the next batch of states to arrive
+            header, message = subscriber.recv_multipart(copy=False)
+
+            # Keep receiving without blocking until the queue is empty
+            if drop_stale:
+                while True:
+                    try:
+                        header, message = subscriber.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+
+            num_states, num_sensors = BATCH_HEADER.unpack(header.bytes)
+            states = np.frombuffer(message.buffer, dtype=STATE_DTYPE).reshape(num_states, num_sensors)
+            if drop_stale:
+                yield states[-1]
+            else:
+                yield from states
 
     # Ensure that streaming is stopped and buffer is cleared when leaving the generator
     finally:
@@ -1,5 +1,6 @@
 import trial
 import math
+import functools
 import os
 import numpy as np
 import pandas as pd
@@ -18,6 +19,27 @@ An instance of this class is made for each cursor.
 '''
 
 
+# Scalar kernel of Cursor.estimate_intention: the predicted speed pointed straight at the target
+def _estimate_intention(x_pos, y_pos, x_vel, y_vel, x_target, y_target):
+    magnitude = math.sqrt(x_vel * x_vel + y_vel * y_vel)
+    x_diff = x_target - x_pos
+    y_diff = y_target - y_pos
+    distance = math.hypot(x_diff, y_diff)
+
+    # The unit vector towards the target, cos and sin of its angle, without computing the angle
+    if distance > 1e-12:
+        scale = magnitude / distance
+        return x_diff * scale, y_diff * scale
+    return magnitude, 0.0
+
+
+# Gaussian velocity profile used while calibrating, scaled so that it sums to 4. Shared by all cursors
+@functools.lru_cache(maxsize=8)
+def _calibration_signal(num_samples):
+    gaussian = signal.windows.gaussian(num_samples, math.sqrt(num_samples))
+    return (4 / np.sum(gaussian)) * gaussian
+
+
 class Cursor():
 
     # Initializing fields
@@ -28,31 +50,51 @@ class Cursor():
     cursor_num = None
     target_label = None
     position = None
+    lower_bound = None  # Corners of the task space the cursor is constrained to
+    upper_bound = None
     dimensions = 2
     subject_id = None
     calibration_signal = None
+    adaptive = False  # True if the model is updated at every iteration
 
-    # Building a Pandas DataFrame
-    data = pd.DataFrame(columns=range(22))
-    data = pd.DataFrame(columns=data.columns.tolist() + ['x', 'y', 'vx', 'vy', 'ix', 'iy'])
+    # Columns of the saved data: the glove state followed by the position, velocity and intended velocity
+    COLUMNS = [*range(trial.NUM_SENSORS), 'x', 'y', 'vx', 'vy', 'ix', 'iy']
 
-    # Creating event vectors
-    events = []
-    event_indeces = []
+    # Event vectors: the event codes and the iterations they happened at
+    events = None
+    event_indeces = None
+    EVENTS_LENGTH = 1024  # Number of events the vectors start with, doubled whenever they fill up
+
+    # Number of rows the data buffer starts with (a 30 minute session, whose last state is also recorded), doubled
+    # whenever it fills up. Stored as float32, which is plenty for the glove sensors and cursor kinematics
+    BUFFER_LENGTH = trial.freq * 60 * 30 + 1
 
     # Initialize the cursor
     def __init__(self, model, calibrating, dimensions, cursor_num, subject_id):
         self.cursor_num = cursor_num
         self.position = trial.center[cursor_num]
+        self.lower_bound = np.subtract(trial.center[cursor_num], 5)
+        self.upper_bound = np.add(trial.center[cursor_num], 5)
         self.cursor_name = f"Cursor{str(cursor_num)}"
         self.calibrating = calibrating
         if calibrating:
             num_samples = trial.freq * trial.calibration_duration
-            self.calibration_signal = signal.gaussian(num_samples, math.sqrt(num_samples))
-            self.calibration_signal = (4 / np.sum(self.calibration_signal)) * self.calibration_signal
+            self.calibration_signal = _calibration_signal(num_samples)
         self.dimensions = dimensions
         self.model = model
         self.subject_id = subject_id
+        self._buf = np.empty((self.BUFFER_LENGTH, len(self.COLUMNS)), dtype=np.float32)
+        self._n = 0
+        self.events = np.empty(self.EVENTS_LENGTH, dtype=np.int16)
+        self.event_indeces = np.empty(self.EVENTS_LENGTH, dtype=np.int64)
+        self._ne = 0
+        self.adaptive = model.algorithm == 'adaptive' and not calibrating
+
+        # Binding the iteration variant once, since these settings don't change during a session
+        if calibrating:
+            self.iterate = self._iterate_calib_1d if dimensions == 1 else self._iterate_calib_2d
+        else:
+            self.iterate = self._iterate_run_1d if dimensions == 1 else self._iterate_run_2d
 
     def center(self):
         self.position = trial.center[self.cursor_num]
@@ -60,84 +102,102 @@ class Cursor():
 
     # Perform an iteration of the cursor, i.e. predict the velocity based on the state
     # Returns the position, velocity of the cursor
-    def iterate(self, state):
-
-        # if calibrating, cursor moves in straight line to target
-        if self.calibrating:
-            # Setting velocity as a gaussian profile
-            diff = np.subtract(self.target_loc, trial.center[self.cursor_num]) / 4
-            if trial.to_center[self.cursor_num]:
-                diff = -diff
-            predicted_velocity = self.calibration_signal[trial.trial_iter] * diff
-            predicted_position = self.position + predicted_velocity
-        else:
+    # iterate() is bound in __init__ to one of the four variants below, depending on the session settings
 
-            state = state.to_numpy()
+    # Calibrating, two dimensions
+    def _iterate_calib_2d(self, state):
+        predicted_position, predicted_velocity = self.calibration_step()
+        self.record(state, predicted_position, predicted_velocity)
+        self.position = predicted_position
+        return predicted_position, predicted_velocity
 
-            # Finding predicted velocity
-            predicted_velocity = self.model.predict(state).reshape(2)
-            predicted_position = np.add(self.position, predicted_velocity)
+    # Calibrating, one dimension
+    def _iterate_calib_1d(self, state):
+        predicted_position, predicted_velocity = self.calibration_step()
+        self.record(state, predicted_position, predicted_velocity)
+        self.position = [self.position[0], predicted_position[1]]
+        return predicted_position, predicted_velocity
 
-            # Constraining the kinematics so the cursor stays within the task space
-            predicted_position[0] = self.constrain(predicted_position, 0)
-            predicted_position[1] = self.constrain(predicted_position, 1)
-            predicted_velocity = predicted_position - self.position
-            self.model.xt = np.append(predicted_velocity, 1).reshape(3,1)
+    # Running the model, two dimensions
+    def _iterate_run_2d(self, state):
+        predicted_position, predicted_velocity = self.decode(state)
+        intended_velocity = self.record(state, predicted_position, predicted_velocity)
 
-            # Cursor only moves in 1 direction if one-dimensional
-            if self.dimensions == 1:
-                predicted_velocity[0] = 0
+        # Updating kalman filter parameters **only if algorithm type is adaptive, real time**
+        if self.adaptive:
+            self.model.adaptive(state, intended_velocity)
 
-        target_pos = self.target_loc
-        if trial.to_center[self.cursor_num]:
-            target_pos = trial.center[self.cursor_num]
+        self.position = predicted_position
+        return predicted_position, predicted_velocity
 
-        intended_velocity = self.estimate_intention(predicted_velocity, target_pos)
+    # Running the model, one dimension
+    def _iterate_run_1d(self, state):
+        predicted_position, predicted_velocity = self.decode(state)
 
-        # Formatting and creating a row representing an iteration to save
-        iteration = np.append(state, predicted_position)
-        iteration = np.append(iteration, predicted_velocity)
-        iteration = np.append(iteration, intended_velocity)
+        # Cursor only moves in 1 direction if one-dimensional
+        predicted_velocity[0] = 0
 
-        # Saving iteration in dataframe
-        data_length = len(self.data.index)
-        self.data.loc[data_length] = iteration
+        intended_velocity = self.record(state, predicted_position, predicted_velocity)
 
         # Updating kalman filter parameters **only if algorithm type is adaptive, real time**
-        if self.model.algorithm == 'adaptive' and not self.calibrating:
+        if self.adaptive:
             self.model.adaptive(state, intended_velocity)
 
-        # Setting position to the predicted position
-        if self.dimensions == 1:
-            self.position = [self.position[0], predicted_position[1]]
-        else:
-            self.position = predicted_position
+        self.position = [self.position[0], predicted_position[1]]
+        return predicted_position, predicted_velocity
+
+    # When calibrating, the cursor moves in straight line to target
+    def calibration_step(self):
+        # Setting velocity as a gaussian profile
+        diff = np.subtract(self.target_loc, trial.center[self.cursor_num]) / 4
+        if trial.to_center[self.cursor_num]:
+            diff = -diff
+        predicted_velocity = self.calibration_signal[trial.trial_iter] * diff
+        predicted_position = self.position + predicted_velocity
+        return predicted_position, predicted_velocity
 
-        # Returning data
+    # Predicting the velocity of the cursor from the glove state with the model
+    def decode(self, state):
+        # Finding predicted velocity
+        predicted_velocity = self.model.predict(state).reshape(2)
+        predicted_position = self.position + predicted_velocity
+
+        # Constraining the kinematics so the cursor stays within the task space
+        predicted_position = np.clip(predicted_position, self.lower_bound, self.upper_bound)
+        predicted_velocity = predicted_position - self.position
+        self.model.xt = np.append(predicted_velocity, 1).reshape(3,1)
         return predicted_position, predicted_velocity
 
+    # Estimating the intended velocity and saving the iteration. Returns the intended velocity
+    def record(self, state, predicted_position, predicted_velocity):
+        target_pos = self.target_loc
+        if trial.to_center[self.cursor_num]:
+            target_pos = trial.center[self.cursor_num]
+
+        intended_velocity = self.estimate_intention(predicted_velocity, target_pos)
+
+        # Saving the iteration as the next row of the data buffer
+        row = self._next_row()
+        row[0:22] = state
+        row[22:24] = predicted_position
+        row[24:26] = predicted_velocity
+        row[26:28] = intended_velocity
+        return intended_velocity
+
 
     # Method to estimate the intention of the user (CursorGoal)
     def estimate_intention(self, predicted_velocity, target_pos):
-        x_pos = self.position[0]
-        y_pos = self.position[1]
-        x_vel = predicted_velocity[0]
-        y_vel = predicted_velocity[1]
-        magnitude = np.sqrt(np.add(np.square(x_vel), np.square(y_vel)))
-        x_diff = np.subtract(target_pos[0], x_pos)
-        y_diff = np.subtract(target_pos[1], y_pos)
-        angle = math.atan2(y_diff, x_diff)
-        x_unit = math.cos(angle) #1 / math.sqrt(1 + (math.tan(angle)**2))
-        y_unit = math.sin(angle) #x_unit * math.tan(angle)
-        intended_velocity = np.multiply(np.asarray([x_unit, y_unit]), magnitude)
-        return intended_velocity
+        x_unit, y_unit = _estimate_intention(self.position[0], self.position[1],
+                                             predicted_velocity[0], predicted_velocity[1],
+                                             target_pos[0], target_pos[1])
+        return np.array([x_unit, y_unit])
 
 
     # Updates parameters at every batch length
     # start = starting index of batch
     def batch_update(self, start):
-        states = self.data.iloc[int(start):,0:22]
-        intended_vel = self.data.iloc[int(start):, 26:]
+        states = self._buf[int(start):self._n, 0:22]
+        intended_vel = self._buf[int(start):self._n, 26:]
         if self.model.algorithm == 'batch':
             self.model.batch(states, intended_vel)
         elif self.model.algorithm == 'smooth_batch':
@@ -145,11 +205,31 @@ class Cursor():
         print("Updated decoder parameters.")
 
 
-    # Constrains the position of the cursor to remain within the screen
-    def constrain(self, position, index):
-        if abs(position[index] - trial.center[self.cursor_num][index]) > 5:
-            position[index] = trial.center[self.cursor_num][index] + (5 * np.sign(position[index] - (index * 0.5)))
-        return position[index]
+    # Makes room in the data buffer for the given number of rows, so that it doesn't have to grow mid-session
+    def reserve(self, num_rows):
+        if num_rows > len(self._buf):
+            buf = np.empty((num_rows, len(self.COLUMNS)), dtype=self._buf.dtype)
+            buf[:self._n] = self._buf[:self._n]
+            self._buf = buf
+
+
+    # Returns the next free row of the data buffer, doubling the buffer if it is full
+    def _next_row(self):
+        if self._n == len(self._buf):
+            self._buf = np.concatenate((self._buf, np.empty_like(self._buf)))
+        row = self._buf[self._n]
+        self._n += 1
+        return row
+
+
+    # Logs an event (target label or event code) that happened at the given iteration
+    def add_event(self, event, index):
+        if self._ne == len(self.events):
+            self.events = np.concatenate((self.events, np.empty_like(self.events)))
+            self.event_indeces = np.concatenate((self.event_indeces, np.empty_like(self.event_indeces)))
+        self.events[self._ne] = event
+        self.event_indeces[self._ne] = index
+        self._ne += 1
 
 
     # Saves data to the relevant file
@@ -158,22 +238,21 @@ class Cursor():
         date = f"{dt.month}_{dt.day}_{dt.year}"
         time = f"{dt.hour}_{dt.minute}"
         file_name = f"subject{self.subject_id}_{self.cursor_name}"
-        events_file = ""
-        time_file = ""
         if self.calibrating:
             data_file = f"{file_name}_calibration_data.csv"
         else:
             data_file = f"{file_name}_{date}_{time}_data.csv"
             events_file = f"{file_name}_{date}_{time}_events.csv"
             time_file = f"{file_name}_{date}_{time}_event_times.csv"
-        if os.path.exists(file_name):
-            header = False
-        else:
-            header = True
-        with open(data_file, 'a') as data_file:
-            self.data.to_csv(data_file, header=header)
-            print(f"Data saved successfully at {dt.hour}:{dt.minute}.")
-        with open(events_file, 'a') as events_file:
-            pd.DataFrame(np.asarray(self.events)).to_csv(events_file, header=header)
-        with open(time_file, 'a') as time_file:
-            pd.DataFrame(np.asarray(self.event_indeces)).to_csv(time_file, header=header)
+        data = pd.DataFrame(self._buf[:self._n], columns=self.COLUMNS)
+        self.append_csv(data, data_file)
+        print(f"Data saved successfully at {dt.hour}:{dt.minute}.")
+        if not self.calibrating:
+            self.append_csv(pd.DataFrame(self.events[:self._ne]), events_file)
+            self.append_csv(pd.DataFrame(self.event_indeces[:self._ne]), time_file)
+
+
+    # Appends the DataFrame to the given csv file in a single write, with a header only if the file is new
+    @staticmethod
+    def append_csv(frame, file_name):
+        frame.to_csv(file_name, mode='a', header=not os.path.exists(file_name))
@@ -1,7 +1,6 @@
 import sys
 import struct
 import serial
-from time import sleep
 import numpy as np
 
 
@@ -16,6 +15,18 @@ class CyberGlove(serial.Serial):
 
     SENSOR_DIGITAL_T = 0.00025     # Time for each sensor's data to be digitize (in seconds)
     DIGITAL_FILTER_T = 0.0001256   # Time for each sensor's data to pass through the digital filter (in seconds)
+
+    # Message for each type of error the glove can respond with, keyed by the second character of the error code
+    ERROR_MESSAGES = {
+        '?': 'Unknown command!',
+        's': 'Sampling rate is set too high!',
+        'n': 'Too many numbers entered!',
+        'y': 'Sync input rate is too fast!',
+        'g': 'Glove not plugged in!',
+    }
+
+    STREAM_RING_LENGTH = 64     # Number of streamed states kept in the ring buffer before their memory is reused
+    CLEAR_QUIET_TIME = 0.05     # Time without any incoming data (in seconds) after which clear() considers the line quiet
     
     def __init__(self, port, **kwargs):
         """
@@ -34,10 +45,24 @@ class CyberGlove(serial.Serial):
 
         super(CyberGlove, self).__init__(port, **kwargs)
 
+        # On Linux, ask the (usually USB) serial driver to hand over received bytes immediately instead of batching
+        # them on its latency timer. Other platforms don't support this and keep their default behaviour
+        if hasattr(self, 'set_low_latency_mode'):
+            try:
+                self.set_low_latency_mode(True)
+            except (NotImplementedError, IOError, ValueError):
+                pass
+
+        # Responses to queries that only change when set through this object, keyed by the query command
+        self._cache = {}
+
         self.num_sensors = self.get_sensors()
         if self.num_sensors == 0:
             raise CyberGloveException("Failed to get the number of active sensors! Try restarting the glove")
 
+        # Each streamed state is an 'S', one byte per sensor, and a terminating null character
+        self.frame_size = 1 + self.num_sensors + 1
+
     def __str__(self):
         return f"CyberGlove on {self.name}"
 
@@ -65,15 +90,20 @@ class CyberGlove(serial.Serial):
 
     def clear(self):
         """Harshly terminate all commands and clear the read buffer"""
-        self.newline()
-        self.stop()
-        # Keep reading until the buffer is guaranteed empty
-        sleep(0.25)  # Allow some time for data to be written to the buffer
-        read = self.read_all()
-        while read:
-            sleep(0.05)  # Allow some time for new data to arrive
-            print(f"Cleared {read}")
-            read = self.read_all()
+        # Send a newline and a stop together and wait until they have actually been transmitted
+        self.write(b'\r\n\x03')
+        self.flush()
+
+        # The glove's reply and any data still in flight arrive after this, so keep draining the input until nothing
+        # more arrives for CLEAR_QUIET_TIME. Each read returns as soon as data is available rather than sleeping
+        timeout = self.timeout
+        self.timeout = self.CLEAR_QUIET_TIME
+        try:
+            self.reset_input_buffer()
+            while self.read(1):
+                self.read(self.in_waiting)
+        finally:
+            self.timeout = timeout
 
     def stream_sensors(self):
         """
@@ -83,19 +113,27 @@ class CyberGlove(serial.Serial):
             Do this simply by calling .close() on the generator object
         The generator will close itself if it encounters data that does not seem to belong to a sensor data stream, but
         this may still result some stream data being dumped in the command response.
+
+        Frames are read straight into a ring buffer of STREAM_RING_LENGTH rows, and each yielded state is a view of its
+        row. Copy a state if it needs to be kept for longer than the next STREAM_RING_LENGTH states.
         """
+        ring = np.empty((self.STREAM_RING_LENGTH, self.frame_size), dtype=np.uint8)
+        index = 0
+
         self.write(b'S')     # Send the command for the CyberGlove to begin streaming data (don't read)
 
         try:
             while True:
-                # Read through the data for the current state which is terminated by a null character
-                buffer_data = self.read_until(b'\x00')
+                # Read the whole state into the next row in a single call rather than byte by byte
+                frame = ring[index]
+                num_read = self.readinto(memoryview(frame))
 
                 # As long as the glove is streaming data, each sensor state set will begin with an S (ascii 83)
-                if buffer_data[0] != 83:
+                # and end with a null character
+                if num_read != self.frame_size or frame[0] != 83 or frame[-1] != 0:
                     raise GeneratorExit('Received data that was not part of the sensor stream.')
-                this_state = self.extract_state(buffer_data)
-                yield this_state
+                yield frame[1:1 + self.num_sensors]
+                index = (index + 1) % self.STREAM_RING_LENGTH
 
         # Ensure that streaming is stopped and buffer is cleared when leaving the generator
         finally:
@@ -129,10 +167,11 @@ class CyberGlove(serial.Serial):
 
     def get_sensors(self):
         """Return the number of sensors available for data retrieval"""
-        response = self.send_command('?N')
-        # Response will be b'?N<#sensors>\x00', so get only the one byte
-        num = self.extract_value(response, 2)
-        return num
+        if '?N' not in self._cache:
+            response = self.send_command('?N')
+            # Response will be b'?N<#sensors>\x00', so get only the one byte
+            self._cache['?N'] = self.extract_value(response, 2)
+        return self._cache['?N']
 
     def get_state(self):
         """Get the current state of all the glove sensors"""
@@ -142,9 +181,10 @@ class CyberGlove(serial.Serial):
 
     def get_filter_status(self):
         """Determine if the digital filter is turned on or off"""
-        response = self.send_command('?F')
-        filter_status = self.extract_value(response, 2)
-        return filter_status
+        if '?F' not in self._cache:
+            response = self.send_command('?F')
+            self._cache['?F'] = self.extract_value(response, 2)
+        return self._cache['?F']
 
     def get_sampling_rate(self):
         """
@@ -198,7 +238,9 @@ class CyberGlove(serial.Serial):
 
     def set_filter_status(self, new_status=1):
         """Set the on/off status of the digital filter"""
-        return self.set_param_flag('f', new_status)
+        response = self.set_param_flag('f', new_status)
+        self._cache.pop('?F', None)
+        return response
 
     def set_sampling_rate(self, rate):
         """Set the sampling rate to as close to the given rate (Hz) as possible"""
@@ -237,13 +279,14 @@ class CyberGlove(serial.Serial):
 
         :return: 2-tuple of numpy arrays: the first element is all the gains, the second element is all the offsets
         """
+        if '?C' in self._cache:
+            return self._cache['?C']
+
         response = self.send_command('?C')
         second_line = self.readline()
 
-        # Concatenate the two lines and remove any spaces between values
-        all_bytes = b''.join([response, second_line])
-        split = all_bytes.split(b' ')
-        all_bytes = b''.join(split)
+        # Concatenate the two lines and remove any spaces between values, without splitting into a list of fragments
+        all_bytes = b''.join([response, second_line]).replace(b' ', b'')
 
         all_values = self.extract_values(all_bytes, 2, 3*self.num_sensors)
 
@@ -253,6 +296,7 @@ class CyberGlove(serial.Serial):
         gains = all_values[(2*self.num_sensors):]
 
         print("getting hardware calibration.")
+        self._cache['?C'] = gains, offsets
         return gains, offsets
 
     def set_sensor_calibration(self, index, gain=None, offset=None):
@@ -267,6 +311,8 @@ class CyberGlove(serial.Serial):
         :param offset: optional integer value to set the hardware offset to. If omitted offset is left unchanged
         :return: None
         """
+        self._cache.pop('?C', None)
+
         if offset is not None:
             offset_command = f"CO {index} {offset}"
             self.send_command(offset_command)
@@ -344,18 +390,17 @@ class CyberGlove(serial.Serial):
         return value
 
     @staticmethod
-    def extract_values(glove_response, prefix_length, values_to_extract):
+    def extract_values(glove_response, prefix_length, values_to_extract, dtype=np.uint8):
         """
         Extract an array of values fromm the given response
 
         :param glove_response: the response of the glove, as bytes or bytearray
         :param prefix_length: the number of extraneous bytes at the front of the array to skip
         :param values_to_extract: the number of values to extract from the array
-        :return: numpy ndarray of integer values
+        :param dtype: optional. The numpy data type of each value (including its byte order), defaults to single bytes
+        :return: numpy ndarray of integer values. This is a view of glove_response, not a copy
         """
-        last_index = prefix_length + values_to_extract
-        byte_values = glove_response[prefix_length:last_index]
-        values = np.frombuffer(byte_values, dtype=np.uint8)
+        values = np.frombuffer(glove_response, dtype=dtype, count=values_to_extract, offset=prefix_length)
         return values
 
     @staticmethod
@@ -375,18 +420,8 @@ class CyberGlove(serial.Serial):
 
         # Error codes are 2 characters, where the second character is unique to the type of error that occurred
         error_char = glove_response.decode(encoding='utf-8')[error_index]
-        if error_char == '?':
-            raise CyberGloveException('Unknown command!')
-        elif error_char == 's':
-            raise CyberGloveException('Sampling rate is set too high!')
-        elif error_char == 'n':
-            raise CyberGloveException('Too many numbers entered!')
-        elif error_char == 'y':
-            raise CyberGloveException('Sync input rate is too fast!')
-        elif error_char == 'g':
-            raise CyberGloveException('Glove not plugged in!')
-        else:
-            raise CyberGloveException(f'Error with unknown error code: {error_char}')
+        message = CyberGlove.ERROR_MESSAGES.get(error_char, f'Error with unknown error code: {error_char}')
+        raise CyberGloveException(message)
 
 
 
@@ -19,6 +19,10 @@ class Graphics():
     targets = []
     cursors = []
 
+    fig = None
+    background = None  # Saved pixels of everything except the circles, see update()
+    changed = False  # Whether any circle has been changed since the screen was last redrawn
+
     def __init__(self, num_cursors):
 
         # Setting up the figure
@@ -31,36 +35,99 @@ class Graphics():
         plt.xticks([])
         plt.yticks([])
         fig.patch.set_facecolor('k')
+        self.fig = fig
+        self.ax = ax
+        self._colors = {}  # Last color given to each circle through set_color, keyed by the circle's id
 
         # Creating the circle objects
         colors = ['mediumblue', 'red']
         for i in range(num_cursors):
-            self.centers.append(plt.Circle((trial.center[i]), radius=0.4))
+            position = tuple(trial.center[i])
+            self.centers.append(plt.Circle(position, radius=0.4))
             self.centers[i].set_facecolor('deeppink')
             ax.add_artist(self.centers[i])
             self.hide(self.centers[i])
-            self.targets.append(plt.Circle(trial.center[i], radius=0.4))
-            self.cursors.append(plt.Circle(trial.center[i], radius=0.25))
+            self.targets.append(plt.Circle(position, radius=0.4))
+            self.cursors.append(plt.Circle(position, radius=0.25))
             self.targets[i].set_facecolor('red')
             self.cursors[i].set_facecolor(colors[i])
             ax.add_artist(self.targets[i])
             ax.add_artist(self.cursors[i])
             self.hide(self.targets[i])
 
+        # The circles are animated: they are left out of full redraws and blitted on top of the background instead
+        for circ in self.centers + self.targets + self.cursors:
+            circ.set_animated(True)
+        fig.canvas.mpl_connect('draw_event', self.on_draw)
+        fig.canvas.draw()
+
+    # Saving the background whenever the whole figure is redrawn (e.g. when the window is resized)
+    def on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_circles()
+
+    def draw_circles(self):
+        for circ in self.centers + self.targets + self.cursors:
+            self.ax.draw_artist(circ)
+
+    # Redrawing the screen by restoring the saved background and only drawing the circles on top of it
+    # If nothing has changed since the last redraw, only the window's events are processed
+    def update(self):
+        canvas = self.fig.canvas
+        if self.changed:
+            canvas.restore_region(self.background)
+            self.draw_circles()
+            canvas.blit(self.fig.bbox)
+            self.changed = False
+        canvas.flush_events()
 
     # Method to move the given circle (target or center) to the given position
     def move(self, circ, position):
-        circ.center = position[0], position[1]
+        center = position[0], position[1]
+        if circ.center != center:
+            circ.center = center
+            self.changed = True
 
     # Moving the cursor to the given position
     def move_cursor(self, position):
-        self.cursors[0].center = position[0], position[1]
+        self.move(self.cursors[0], position)
 
     def show(self, circ):
         circ.set_visible(True)
+        self.changed = True
         
     def hide(self, circ):
         circ.set_visible(False)
+        self.changed = True
+
+    # Changing the color of a circle, skipped if it already has that color since this is called every iteration
+    def set_color(self, circ, color):
+        if self._colors.get(id(circ)) == color:
+            return
+        self._colors[id(circ)] = color
+        circ.set_facecolor(color)
+        self.changed = True
+
+
+# Stand-in for Graphics that draws nothing, used when a session is replayed without a window (see trial.run)
+class HeadlessGraphics(Graphics):
+
+    def __init__(self, num_cursors):
+        self.centers = [None] * num_cursors
+        self.targets = [None] * num_cursors
+        self.cursors = [None] * num_cursors
+
+    def update(self):
+        pass
+
+    def move(self, circ, position):
+        pass
+
+    def show(self, circ):
+        pass
+
+    def hide(self, circ):
+        pass
 
     def set_color(self, circ, color):
-        circ.set_facecolor(color)
\ No newline at end of file
+        pass
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from scipy import linalg
 import trial
 import os
 
@@ -31,9 +32,11 @@ class KalmanFilter():
     BATCH_DURATION = 300 # Duration of batch in seconds for the Batch algorithm
     SMOOTH_BATCH_DURATION = 80 # Duration of batch in seconds for the SmoothBatch algorithm
 
-    A = [[a, 0, 0], [0, a, 0], [0, 0, 1]]
+    A = np.array([[a, 0, 0], [0, a, 0], [0, 0, 1]])
     W = np.identity(num_states)
     C = np.empty((num_observations, num_states))
+    A_T = np.transpose(A) # Transposes kept alongside A and C, updated whenever they change
+    C_T = np.transpose(C)
     Q = np.empty((num_observations, num_observations))
 
     P = []
@@ -46,6 +49,7 @@ class KalmanFilter():
         self.P = np.zeros((self.num_states, self.num_states))
         self.K = np.zeros((self.num_states, self.num_observations))
         self.xt = np.asarray([[0], [0], [1]])
+        self.xt_aug = np.ones((self.num_states, 1))
         self.algorithm = algorithm
         if algorithm == 'batch':
             self.batch_length = self.BATCH_DURATION
@@ -72,20 +76,12 @@ class KalmanFilter():
         data = pd.read_csv(file_name)
         states = data.iloc[:, 1:trial.STATE_INDEX].copy()
         kinematics = data.iloc[:, trial.STATE_INDEX:].copy()
-        shuffled_states = states.sample(frac=1)
-        shuffled_data = pd.DataFrame(columns=data.columns[1:])
-        for i in range(len(data)):
-            row = np.append(shuffled_states.iloc[i,:], kinematics.iloc[i,:])
-            shuffled_data.loc[len(shuffled_data)] = row
+        shuffled_states = states.sample(frac=1).reset_index(drop=True)
+        shuffled_data = pd.concat([shuffled_states, kinematics.reset_index(drop=True)], axis=1)
         print(shuffled_data)
 
         file_name = f"shuffled_{file_name}"
-        if os.path.exists(file_name):
-            header = False
-        else:
-            header = True
-        with open(file_name, 'a') as file:
-            shuffled_data.to_csv(file, header=header)
+        shuffled_data.to_csv(file_name, mode='a', header=not os.path.exists(file_name))
         return shuffled_data
 
     # Center the model
@@ -94,40 +90,31 @@ class KalmanFilter():
 
     # Perform a KF iteration
     def predict(self, state):
-        self.time_update()
-        self.measurement_update(state)
+        # A priori estimate
+        self.xt = self.A @ self.xt # + wt # Projecting the kinematic state
+        self.P = self.A @ self.P @ self.A_T + self.W # Projecting the error
+
+        # Calculating Kalman gain, K = P C^T (C P C^T + Q)^-1
+        ptc = self.P @ self.C_T
+        self.K = self.right_divide(ptc, self.C @ ptc + self.Q)
+
+        # Updating estimate of cursor kinematics
+        residual = state.reshape(self.num_observations, 1) - self.C @ self.xt
+        self.xt = self.xt + self.K @ residual
+
+        # Updating prediction error
+        self.Pt = self.P - self.K @ (self.C @ self.P)
         return self.xt[0:2]
 
-    # A priori estimate
-    def time_update(self):
-        self.xt = np.matmul(self.A, self.xt) # + wt # Projecting the kinematic state
-        self.P = np.matmul(self.A, np.matmul(self.P, np.transpose(self.A))) + self.W # Projecting the error
-
-    # Second update of the KF iteration
-    def measurement_update(self, state):
-        self.gain()
-        self.update_estimate(state)
-        self.update_error()
-
-    # Calculating Kalman gain
-    def gain(self):
-        ptc = np.matmul(self.P, np.transpose(self.C))
-        sum = np.add(np.matmul(self.C, ptc), self.Q)
-        inv = np.linalg.pinv(sum)
-        self.K = np.matmul(ptc, inv)
-
-    # Updating estimate of cursor kinematics
-    def update_estimate(self, state):
-        weighted_estimate = np.matmul(self.C, self.xt)
-        residual = np.subtract(state.reshape(self.num_observations, 1), weighted_estimate)
-        self.xt = np.add(self.xt, np.matmul(self.K, residual))
-
-    # Updating prediction error
-    def update_error(self):
-        product = np.matmul(self.K, self.C)
-        identity = np.identity(product.shape[0])
-        diff = identity - product
-        self.Pt = np.matmul(diff, self.P)
+    # Calculating x S^-1 for a symmetric positive-definite matrix S with a Cholesky solve rather than inverting it
+    @staticmethod
+    def right_divide(x, S):
+        try:
+            factor = linalg.cho_factor(S, lower=True, check_finite=False)
+            return np.transpose(linalg.cho_solve(factor, np.transpose(x), check_finite=False))
+        except linalg.LinAlgError:
+            # S is singular, e.g. when a sensor never moved during calibration
+            return np.matmul(x, np.linalg.pinv(S))
 
     # Adding a constant to keep mean constant
     def add_constant(self, x):
@@ -158,17 +145,20 @@ class KalmanFilter():
     # Y = glove states, X = intended velocities
     def batch(self, Y, X):
         self.C, self.Q = self.MLE(Y, X)
+        self.C_T = np.transpose(self.C)
 
     # Perform adaptive KF update (in real-time at every iteration)
     def adaptive(self, yt, xt):
-        xt = np.reshape(xt, (2, 1))
+        # Writing the velocity into a preallocated column whose constant last row is already 1
+        self.xt_aug[0:2, 0] = xt
+        xt = self.xt_aug
         yt = np.reshape(yt, (self.num_observations, 1))
-        xt = self.add_constant(xt)
 
         # Calculating C
         temp_C = np.subtract(np.matmul(self.C, xt), yt)
         temp_C = np.matmul(self.mu * temp_C, np.transpose(xt))
         self.C = np.subtract(self.C, temp_C)
+        self.C_T = np.transpose(self.C)
 
         # Calculating Q
         temp_Q = np.subtract(yt, np.matmul(self.C, xt))
@@ -178,5 +168,6 @@ class KalmanFilter():
     # Perform SmoothBatch update
     def smooth_batch(self, Y, X):
         C, Q = self.MLE(Y, X)
-        self.C = np.add((1 - self.rho)*C, self.rho*C)
-        self.Q = np.add((1 - self.rho)*Q, self.rho*Q)
\ No newline at end of file
+        self.C = (1 - self.rho) * C + self.rho * self.C
+        self.C_T = np.transpose(self.C)
+        self.Q = (1 - self.rho) * Q + self.rho * self.Q
\ No newline at end of file
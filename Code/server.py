@@ -1,13 +1,18 @@
 import os
 import zmq
-from connect import open_glove
+import numpy as np
+from connect import open_glove, STATE_DTYPE, BATCH_HEADER
 
 
 STREAM_LOCATION = os.environ.get('GLOVE_STREAM_LOCATION', "127.0.0.1:5556")
 REPLY_LOCATION = os.environ.get('GLOVE_REPLY_LOCATION', "127.0.0.1:5557")
 
+# "ipc" can be used instead when every subscriber runs on the same (non-Windows) machine, which avoids going through
+# the TCP loopback stack. The locations are then used as the names of the socket files
 CONNECTION_PROTOCOL = os.environ.get('COMMUNICATION_PROTOCOL', "tcp")
 
+STREAM_HWM = 64  # Number of states queued per subscriber before new states are dropped for it
+
 
 def make_context():
     """Create and return a ZeroMQ (zmq) server context that can be used to connect to create sockets"""
@@ -15,7 +20,59 @@ def make_context():
     return context
 
 
-def publish_glove_state(glove, sampling_rate=None, calibration=None):
+def calibrate_state(state, calibration, out=None):
+    """
+    Apply a calibration to a glove state, writing the calibrated state into out if it is given
+
+    :param state: the glove state, as returned by the CyberGlove
+    :param calibration: either a function that takes a state and returns the calibrated state, or a (gain, offset) pair
+        of arrays with one value per sensor. A pair is applied as gain * (state - offset)
+    :param out: optional. Array the calibrated state is written to, in place and without allocating. If omitted, the
+        calibrated state is returned as a new array (whatever the function returns, or float64 for a pair)
+    :return: the calibrated state
+    """
+    if out is None:
+        if callable(calibration):
+            return calibration(state)
+        gain, offset = calibration
+        return np.multiply(np.subtract(state, offset, dtype=np.float64), gain)
+
+    if callable(calibration):
+        out[:] = calibration(state)
+    else:
+        gain, offset = calibration
+        np.subtract(state, offset, out=out)
+        np.multiply(out, gain, out=out)
+    return out
+
+
+def pin_process(cpu=None, realtime_priority=None):
+    """
+    Keep the current process on a single CPU core and optionally give it a real-time scheduling priority
+
+    This reduces the jitter of a process that spends its time waiting on the glove. Both settings are only available on
+    Linux, and a real-time priority usually needs elevated privileges. Settings that can't be applied are skipped
+
+    :param cpu: optional. Index of the CPU core the process should run on
+    :param realtime_priority: optional. SCHED_FIFO priority (1-99) to run the process with, low values are recommended
+    :return: None
+    """
+    if cpu is not None:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {cpu})
+        else:
+            print("CPU pinning is not supported on this platform, skipping.")
+
+    if realtime_priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+        except AttributeError:
+            print("Real-time scheduling is not supported on this platform, skipping.")
+        except PermissionError:
+            print("Not permitted to use real-time scheduling, skipping.")
+
+
+def publish_glove_state(glove, sampling_rate=None, calibration=None, batch_size=1, cpu=None, realtime_priority=None):
     """
     Open a CyberGlove object and create a live-stream of the data that can be captured in any other process
 
@@ -23,17 +80,26 @@ def publish_glove_state(glove, sampling_rate=None, calibration=None):
     on the CyberGlove object). Each state of the glove is then published on a ZMQ publisher socket, so that it can
     be subscribed to and receive the live feed from the CyberGlove.
 
-    The state is converted to a simple python list before being published.
+    The states are collected into batches of STATE_DTYPE arrays, and each batch is published as a BATCH_HEADER frame
+    followed by the raw bytes of the batch.
 
     :param glove: an open and ready CyberGlove object. Will not be available until publishing is finished
     :param sampling_rate: optional. If given will set the CyberGlove to sample at this rate
-    :param calibration: optional. If given, this calibration will be applied to each state before it is published
+    :param calibration: optional. If given, this calibration will be applied to each state before it is published.
+        See calibrate_state; a (gain, offset) pair keeps the loop free of allocations
+    :param batch_size: optional. Number of states published together in a single message. Larger batches need fewer
+        sends, but each state waits until its batch is full (batch_size / sampling rate seconds at most)
+    :param cpu: optional. CPU core to pin the publishing process to, see pin_process
+    :param realtime_priority: optional. Real-time priority to run the publishing process with, see pin_process
     :return: None.
     """
 
+    pin_process(cpu, realtime_priority)
+
     # Create the context and publisher
     context = make_context()
     publisher = context.socket(zmq.PUB)
+    publisher.setsockopt(zmq.SNDHWM, STREAM_HWM)
     address = f"{CONNECTION_PROTOCOL}://{STREAM_LOCATION}"
     publisher.bind(address)
 
@@ -42,18 +108,27 @@ def publish_glove_state(glove, sampling_rate=None, calibration=None):
         glove.set_sampling_rate(sampling_rate)
     sensor_stream = glove.stream_sensors()
 
+    # Buffer the batch of states is collected in before it is sent
+    header = BATCH_HEADER.pack(batch_size, glove.num_sensors)
+    batch = np.empty((batch_size, glove.num_sensors), dtype=STATE_DTYPE)
+    count = 0
+
     print(f"Opening glove state stream on '{address}'...")
 
     try:
         for state in sensor_stream:
 
-            # Apply the given calibration if it has been passed
+            # Apply the given calibration if it has been passed, directly into the batch
             if calibration is not None:
-                state = calibration(state)
+                calibrate_state(state, calibration, out=batch[count])
+            else:
+                batch[count] = state
+            count += 1
 
-            # Convert the state (numpy array) to a simple python list for simplicity
-            simple_state = state.tolist()
-            publisher.send_json(simple_state)
+            # Send the raw bytes of the batch straight from the array once it is full, see connect.connect_state_stream
+            if count == batch_size:
+                publisher.send_multipart([header, batch])
+                count = 0
 
     # Ensure that the stream, socket, and context are always closed on error or exit
     finally:
@@ -72,7 +147,8 @@ def make_glove_state_reply(glove, calibration=None):
     received, it will trigger a KeyboardInterrupt error and will cause the socket to shut down.
 
     :param glove: an open and ready CyberGlove object. Will not be available until the reply server is closed
-    :param calibration: optional. If given, this calibration will be applied to the state before it is sent in reply
+    :param calibration: optional. If given, this calibration will be applied to the state before it is sent in reply.
+        See calibrate_state
     :return: None
     """
 
@@ -92,7 +168,7 @@ def make_glove_state_reply(glove, calibration=None):
             # Get the glove state and apply a calibration if it was passed
             state = glove.get_state()
             if calibration is not None:
-                state = calibration(state)
+                state = calibrate_state(state, calibration)
 
             # Send the transformed and simplified (numpy array -> list) glove state back to the requester
             simple_state = state.tolist()
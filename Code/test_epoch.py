@@ -1,5 +1,6 @@
 import trial
 from cursor import Cursor
+import numpy as np
 import pandas as pd
 from kalman import KalmanFilter
 
@@ -55,7 +56,15 @@ for i in range(num_cursors):
 
 # Using pre-existing data
 data_file = 'subject99_Cursor0_session1_data.csv'
-glove_data = pd.read_csv(data_file)
+# Only the sensor columns (named by sensor index) are replayed, so the rest of the file is not parsed at all
+sensor_columns = [str(sensor) for sensor in range(trial.NUM_SENSORS)]
+# Parse with pyarrow's multithreaded reader when it is installed, otherwise fall back to pandas' own parser
+try:
+    glove_data = pd.read_csv(data_file, usecols=sensor_columns, dtype=np.float64, engine='pyarrow')
+except ImportError:
+    glove_data = pd.read_csv(data_file, usecols=sensor_columns, dtype=np.float64)
 
-# Running the session
-trial.run(glove_data, cursors, save_data, session_length, num_dimensions)
+# Running the session, replaying the saved sensor states as fast as possible as if they were streamed from the glove
+# Each state is a row of this array, kept in row-major order so every state is contiguous in memory
+states = np.ascontiguousarray(glove_data[sensor_columns].to_numpy())
+trial.run(states, cursors, save_data, session_length, num_dimensions, realtime=False)
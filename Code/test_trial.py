@@ -1,11 +1,7 @@
 import numpy as np
 import math
-import random
-import graphics
 from time import sleep
-from datetime import datetime
 import time
-import matplotlib.pyplot as plt
 
 
 '''
@@ -22,15 +18,19 @@ This script uses the classes created (cursor, kalman, and graphics) to run throu
 
 # Defining distances and positions of the workspace
 dist = 4/math.sqrt(2)
-center = [[0, 0], [0, 0]]
-target_positions = [[0, 4],
-                    [dist, dist],
-                    [4, 0],
-                    [dist, -dist],
-                    [0, -4],
-                    [-dist, -dist],
-                    [-4, 0],
-                    [-dist, dist]]
+center = np.zeros((2, 2))  # Center of the workspace of each cursor
+TARGET_POSITIONS = np.array([[0, 4],
+                             [dist, dist],
+                             [4, 0],
+                             [dist, -dist],
+                             [0, -4],
+                             [-dist, -dist],
+                             [-4, 0],
+                             [-dist, dist]])
+
+# Colors of each cursor's target, and the color a target turns while a cursor is on it
+TARGET_COLORS = ('lightskyblue', 'salmon')
+REACHED_COLOR = 'lime'
 
 
 # Event codes
@@ -42,13 +42,14 @@ SESSION_OVER = 14
 UPDATED_PARAMS = 15
 
 # Defining values of the trial
-time_start = datetime.now().microsecond
+RNG = np.random.default_rng() # Single random number generator used to choose the targets
 freq = 32
 loop_duration = 1.0 / freq
 trial_duration = 5
 calibration_duration = 1
 
 MAX_DISTANCE = 0.4 # Distance the cursor has to be away from the target/center to count
+MAX_DISTANCE_SQ = MAX_DISTANCE * MAX_DISTANCE # Squared, so distances can be compared without a square root
 HOLD_TIME = 0.35 # How long the cursor has to be at the target/center
 NUM_SENSORS = 22 # Number of sensors of the glove
 NUM_TARGETS = 8
@@ -67,77 +68,81 @@ trial_iter = None  # Number of iterations in the trial so far
 
 
 # Run through a trial with a model. save_data = True if you want to save data to a csv file
-def run(glove_data, cursors, save_data, session_length, dimensions):
+# realtime = False replays the states as fast as possible, without a window, countdown, or loop timing
+def run(glove_data, cursors, save_data, session_length, dimensions, realtime=True):
+
+    # Graphics (and with it matplotlib) is only loaded once a session is run, not whenever this module is imported
+    import graphics
 
-    screen = graphics.Graphics(num_cursors=len(cursors))
+    if realtime:
+        screen = graphics.Graphics(num_cursors=len(cursors))
+    else:
+        screen = graphics.HeadlessGraphics(num_cursors=len(cursors))
 
     # Initializing counters
     global trial_iter
     trial_iter = np.zeros(len(cursors))  # Number of samples in the trial so far
     total_count = np.zeros(len(cursors)) # Number of total trials
     success = np.zeros(len(cursors)) # Number of successful trials
-    state_iter = 0 # Number of total iterations in the session
     batch_iter = 0 # Number of iterations in batch so far
     batch_start = 0 # Index where the next batch update begins
 
-    target_reached = []
-    for i in range(len(cursors)):
-        target_reached.append(True)
     pos_count = np.zeros(len(cursors))
 
-    plt.pause(0.0025)
-    countdown()
+    # Sizing the data buffers for the whole session so they never grow during it
+    for cursor in cursors:
+        cursor.reserve(session_length * freq + 1)
+
+    if realtime:
+        screen.update()
+        countdown()
     prev = time.time()
 
-    times = []
+    # Using saved data instead of glove, converted to an array once rather than a pandas lookup every iteration
+    # pandas hands back the columns in column-major order, so copy them into row-major order to keep each state contiguous
+    states = np.ascontiguousarray(glove_data.iloc[:, 1:STATE_INDEX].to_numpy(dtype=np.float64))
 
-    # Using saved data instead of glove
-    for index in range(glove_data.shape[0]):
-        current_state = glove_data.iloc[index, 1:STATE_INDEX]
+    # If the training data is standardized, do the same to all the glove states at once
+    if standardized:
+        states = (states - means) / stds
 
-        # If the training data is standardized, do the same to the glove state
-        if standardized:
-            global diff
-            diff = np.subtract(current_state, means)
-            current_state = np.divide(diff, stds)
+    # Iterating over the rows directly, counting the total iterations in the session
+    for state_iter, current_state in enumerate(states):
 
         # Perform an iteration for each cursor
-        velocities = []
-        for i in range(len(cursors)):
+        for i, cursor in enumerate(cursors):
 
-            cursor = cursors[i]
+            # The circles of this cursor, looked up once per iteration
+            cursor_circle = screen.cursors[cursor.cursor_num]
+            target_circle = screen.targets[cursor.cursor_num]
+            center_circle = screen.centers[cursor.cursor_num]
 
             # If this is the beginning of the session...
             if state_iter == 0:
                 get_target(cursor, dimensions)
                 show_target(screen, cursor)
-                cursor.events.append(cursor.target_label)
-                cursor.event_indeces.append(state_iter)
+                cursor.add_event(cursor.target_label, state_iter)
                 total_count[i] += 1
                 print(f"Trial #{int(total_count[i])} for Cursor #{cursor.cursor_num + 1}")
 
             # Perform iteration
             pos, vel = cursor.iterate(current_state)
-            screen.move(screen.cursors[cursor.cursor_num], pos)
-            velocities = np.append(velocities, vel)
+            screen.move(cursor_circle, pos)
 
             # Perform a batch update when the time has reached the batch length
             if cursor.model.algorithm != 'adaptive':
                 if batch_iter // freq >= cursor.model.batch_length:
                     cursor.batch_update(batch_start)
-                    cursor.events.append(UPDATED_PARAMS)
-                    cursor.event_indeces.append(state_iter)
+                    cursor.add_event(UPDATED_PARAMS, state_iter)
                     batch_start = state_iter
                     batch_iter = 0
 
             # If reach time has expired, remove target and show center
             if trial_iter[i] > trial_duration * freq and not to_center[i]:
-                screen.hide(screen.targets[cursor.cursor_num])
+                screen.hide(target_circle)
                 show_center(screen, cursor)
                 to_center[i] = True
-                target_reached[i] = False
-                cursor.events.append(TIME_EXPIRED)
-                cursor.event_indeces.append(state_iter)
+                cursor.add_event(TIME_EXPIRED, state_iter)
                 print("FAIL")
 
             # else, check if the cursor is within proximity of the target/center
@@ -146,19 +151,16 @@ def run(glove_data, cursors, save_data, session_length, dimensions):
                 trial_iter[i] += 1
 
                 # If the cursor reaches the center to initialize a new trial...
-                colors = ['lime', 'lime']
                 if within_proximity(pos, center[i]) and to_center[i]:
                     pos_count[i] += 1
-                    screen.set_color(screen.centers[i], 'pink')
+                    screen.set_color(center_circle, 'pink')
                     if pos_count[i] / freq >= HOLD_TIME:
-                        screen.hide(screen.centers[i])
+                        screen.hide(center_circle)
                         to_center[i] = False
                         get_target(cursor, dimensions)
                         show_target(screen, cursor)
-                        cursor.events.append(CENTER_REACHED)
-                        cursor.event_indeces.append(state_iter)
-                        cursor.events.append(cursor.target_label)
-                        cursor.event_indeces.append(state_iter)
+                        cursor.add_event(CENTER_REACHED, state_iter)
+                        cursor.add_event(cursor.target_label, state_iter)
                         total_count[i] += 1
                         print(f"Trial #{int(total_count[i])} for Cursor #{cursor.cursor_num + 1}")
                         pos_count[i] = 0
@@ -167,44 +169,38 @@ def run(glove_data, cursors, save_data, session_length, dimensions):
                 # If the cursor reaches the target in time...
                 elif within_proximity(pos, cursor.target_loc) and not to_center[i]:
                     pos_count[i] += 1
-                    screen.set_color(screen.targets[cursor.cursor_num], colors[i])
+                    screen.set_color(target_circle, REACHED_COLOR)
                     if pos_count[i] / freq >= HOLD_TIME:
-                        screen.hide(screen.targets[cursor.cursor_num])
+                        screen.hide(target_circle)
                         show_center(screen, cursor)
                         to_center[i] = True
-                        target_reached[i] = True
                         success[i] += 1
                         pos_count[i] = 0
-                        cursor.events.append(TARGET_REACHED)
-                        cursor.event_indeces.append(state_iter)
+                        cursor.add_event(TARGET_REACHED, state_iter)
                         print("SUCCESS")
                 else:
-                    colors = ['lightskyblue', 'salmon']
-                    screen.set_color(screen.targets[cursor.cursor_num], colors[i])
-                    screen.set_color(screen.centers[cursor.cursor_num], 'deeppink')
+                    screen.set_color(target_circle, TARGET_COLORS[cursor.cursor_num])
+                    screen.set_color(center_circle, 'deeppink')
 
             # Check if session time is up
             if state_iter / freq >= session_length:
-                cursor.events.append(SESSION_OVER)
-                cursor.event_indeces.append(state_iter)
+                cursor.add_event(SESSION_OVER, state_iter)
 
         # Calculate how much time to sleep
-        now = time.time()
-        current_time_diff = now - prev
-        pause_time = loop_duration - current_time_diff
-        if pause_time < 0:
-            pause_time = 1e-10
-        plt.pause(pause_time)
-        temp = time.time()
-        times.append(temp - prev)
-        prev = temp
+        if realtime:
+            now = time.time()
+            current_time_diff = now - prev
+            pause_time = loop_duration - current_time_diff
+            if pause_time < 0:
+                pause_time = 1e-10
+            screen.update()
+            sleep(pause_time)
+            prev = time.time()
 
         # Check if time is up
         if state_iter / freq >= session_length:
             break
-        else:
-            state_iter += 1
-            batch_iter += 1
+        batch_iter += 1
 
     # Saving data to file
     if save_data:
@@ -214,6 +210,7 @@ def run(glove_data, cursors, save_data, session_length, dimensions):
 
 # Used to generate calibration data
 def calibrate(stream, cursors, calibration_length):
+    import graphics
     screen = graphics.Graphics(num_cursors=1)
     cursor = cursors[0]
     cursor.target_label = 0
@@ -224,6 +221,9 @@ def calibrate(stream, cursors, calibration_length):
     global to_center
     to_center[0] = True
 
+    # Each calibration trial moves to the target and back to the center
+    cursor.reserve(2 * (calibration_length + 1) * calibration_duration * freq)
+
     countdown()
     prev = time.time()
 
@@ -259,16 +259,15 @@ def calibrate(stream, cursors, calibration_length):
         if pause_time < 0:
             print("long")
             pause_time = 10e-10
-        plt.pause(pause_time)
+        screen.update()
+        sleep(pause_time)
         prev = time.time()
-        plt.pause(pause_time)
         trial_iter += 1
 
 
 # Show the target of the cursor on the screen
 def show_target(screen, cursor):
-    colors = ['lightskyblue', 'salmon']
-    screen.set_color(screen.targets[cursor.cursor_num], colors[cursor.cursor_num])
+    screen.set_color(screen.targets[cursor.cursor_num], TARGET_COLORS[cursor.cursor_num])
     screen.move(screen.targets[cursor.cursor_num], cursor.target_loc)
     screen.show(screen.targets[cursor.cursor_num])
 
@@ -281,20 +280,18 @@ def show_center(screen, cursor):
 
 # Generate a random target for the cursor passed in
 def get_target(cursor, dimensions):
-    index = np.random.randint(0, NUM_TARGETS)
+    index = RNG.integers(0, NUM_TARGETS)
     cursor.target_label = index
     constant = 0
     if dimensions == 1:
-        index = int((NUM_TARGETS / 2) * random.randint(0, 1))
+        index = int((NUM_TARGETS / 2) * RNG.integers(0, 2))
         constant = dist * ((cursor.cursor_num * 2) - 1)
-    cursor.target_loc = [target_positions[index][0] + constant, target_positions[index][1]]
+    cursor.target_loc = TARGET_POSITIONS[index] + (constant, 0)
 
 
 # Move cursor to center
 def center_cursor(cursor):
-    x_vel = center[cursor.cursor_num][0] - cursor.position[0]
-    y_vel = center[cursor.cursor_num][1] - cursor.position[1]
-    vel = np.append(x_vel, y_vel)
+    vel = center[cursor.cursor_num] - cursor.position
     cursor.center()
     return vel
 
@@ -303,11 +300,7 @@ def center_cursor(cursor):
 def within_proximity(cursor_pos, target_pos):
     x_res = cursor_pos[0] - target_pos[0]
     y_res = cursor_pos[1] - target_pos[1]
-    dist = math.sqrt(x_res**2 + y_res**2)
-    if dist < MAX_DISTANCE:
-        return True
-    else:
-        return False
+    return x_res * x_res + y_res * y_res < MAX_DISTANCE_SQ
 
 
 # Standardizing given data
@@ -319,10 +312,12 @@ def standardize(data):
     standardized = True
     standardized_data = data.copy()
 
-    means = standardized_data.iloc[:,1:STATE_INDEX].mean(axis=0)
-    stds = standardized_data.iloc[:,1:STATE_INDEX].std(axis=0)
+    # Work on the sensor columns as a plain array, so the statistics and scaling skip pandas' label alignment
+    states = standardized_data.iloc[:,1:STATE_INDEX].to_numpy(dtype=np.float64)
+    means = states.mean(axis=0)
+    stds = states.std(axis=0, ddof=1)
     stds[stds == 0] = 1e-6
-    standardized_data.iloc[:,1:STATE_INDEX] = standardized_data.iloc[:,1:STATE_INDEX].subtract(means).divide(stds)
+    standardized_data.iloc[:,1:STATE_INDEX] = (states - means) / stds
 
     return standardized_data
 